@@ -10,7 +10,7 @@ import argparse
 import csv
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any, List, Set
+from typing import Optional, Dict, Any, List, Set, Tuple
 
 try:
     from supabase import create_client, Client
@@ -32,26 +32,47 @@ REQUIRED_TAGS = ['dom_words', 'lang_en', 'time_permanent', 'type_definition']
 DEFAULT_DECK = 'Main'
 DEFAULT_NOTE_TYPE = 'WordDefinition'
 
+# IDs per status update; the filter is sent as an `id=in.(...)` query
+# string, so large queues are split to stay under URI length limits
+QUEUE_UPDATE_BATCH_SIZE = 200
+
+# Write buffer for the import file, so large exports flush in few syscalls
+CSV_BUFFER_SIZE = 1 << 20
+
+# Newlines would split a CSV row, so they are flattened to spaces
+NEWLINE_TO_SPACE = str.maketrans({'\n': ' ', '\r': ' '})
+
 
 def update_queue_status(
     supabase: Client,
-    queue_id: int,
+    queue_ids: List[int],
     pushed: bool,
-    error: Optional[str] = None
-):
-    """Update the queue row with push status."""
+    error: Optional[str] = None,
+    pushed_at: Optional[str] = None
+) -> bool:
+    """
+    Update the queue rows with push status, QUEUE_UPDATE_BATCH_SIZE rows per request.
+    pushed_at is the run's push timestamp; it defaults to the current time.
+    Returns True if every batch was updated.
+    """
     update_data: Dict[str, Any] = {}
     
     if pushed:
-        update_data['pushed_to_anki_at'] = datetime.utcnow().isoformat() + 'Z'
+        update_data['pushed_to_anki_at'] = pushed_at or datetime.utcnow().isoformat() + 'Z'
         update_data['push_error'] = None
     else:
         update_data['push_error'] = error
     
-    try:
-        supabase.table('anki_queue').update(update_data).eq('id', queue_id).execute()
-    except Exception as e:
-        print(f"  Error updating queue status: {e}")
+    success = True
+    for start in range(0, len(queue_ids), QUEUE_UPDATE_BATCH_SIZE):
+        batch = queue_ids[start:start + QUEUE_UPDATE_BATCH_SIZE]
+        try:
+            supabase.table('anki_queue').update(update_data).in_('id', batch).execute()
+        except Exception as e:
+            print(f"  Error updating queue status: {e}")
+            success = False
+    
+    return success
 
 
 def format_tags(tags: List[str]) -> str:
@@ -59,17 +80,48 @@ def format_tags(tags: List[str]) -> str:
     return ' '.join(tags)
 
 
-def escape_csv_field(field: str) -> str:
-    """Escape CSV field if it contains commas, quotes, or newlines."""
-    if not field:
-        return ''
-    # Replace newlines with spaces
-    field = field.replace('\n', ' ').replace('\r', ' ')
-    # If field contains comma, quote, or newline, wrap in quotes and escape quotes
-    if ',' in field or '"' in field:
-        field = field.replace('"', '""')
-        field = f'"{field}"'
-    return field
+def select_export_items(
+    items: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], List[str], List[str]]:
+    """
+    Pick the items to write to the CSV import file.
+    Returns the items to export, the words skipped as duplicates within
+    the file, and the words skipped for a missing definition.
+    """
+    export_items: List[Dict[str, Any]] = []
+    duplicates: List[str] = []
+    missing: List[str] = []
+    
+    # Track words we've already exported (for deduplication within the file)
+    seen_words: Set[str] = set()
+    
+    for item in items:
+        word = item['word']
+        
+        # Skip if we've already exported this word in this file
+        normalized_word = word.lower().strip()
+        if normalized_word in seen_words:
+            duplicates.append(word)
+            continue
+        
+        # Skip if definition is missing
+        if not item.get('definition'):
+            missing.append(word)
+            continue
+        
+        seen_words.add(normalized_word)
+        export_items.append(item)
+    
+    return export_items, duplicates, missing
+
+
+def format_csv_row(item: Dict[str, Any]) -> List[str]:
+    """Format a queue item as a Front, Back, Tags row (csv.writer handles quoting)."""
+    return [
+        item['word'].translate(NEWLINE_TO_SPACE),
+        item['definition'].translate(NEWLINE_TO_SPACE),
+        format_tags(item.get('tags', REQUIRED_TAGS)),
+    ]
 
 
 def generate_anki_import_file(
@@ -82,46 +134,22 @@ def generate_anki_import_file(
     Format: Front, Back, Tags
     Returns the number of items written.
     """
-    written_count = 0
+    export_items, duplicates, missing = select_export_items(items)
     
-    with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
+    with open(output_path, 'w', newline='', encoding='utf-8', buffering=CSV_BUFFER_SIZE) as csvfile:
+        writer = csv.writer(csvfile, quoting=csv.QUOTE_MINIMAL)
         
         # Write header (Anki doesn't require it, but it's helpful)
         # Note: Anki import expects: Front, Back, Tags (or just Front, Back)
         writer.writerow(['Front', 'Back', 'Tags'])
-        
-        # Track words we've already written (for deduplication within the file)
-        seen_words: Set[str] = set()
-        
-        for item in items:
-            word = item['word']
-            definition = item.get('definition', '')
-            tags = item.get('tags', REQUIRED_TAGS)
-            
-            # Normalize word for duplicate checking
-            normalized_word = word.lower().strip()
-            
-            # Skip if we've already written this word in this file
-            if normalized_word in seen_words:
-                print(f"  ⚠ Skipping duplicate in file: {word}")
-                continue
-            
-            # Skip if definition is missing
-            if not definition:
-                print(f"  ⚠ Skipping {word}: missing definition")
-                continue
-            
-            # Write the row
-            front = escape_csv_field(word)
-            back = escape_csv_field(definition)
-            tags_str = format_tags(tags)
-            
-            writer.writerow([front, back, tags_str])
-            seen_words.add(normalized_word)
-            written_count += 1
-    
-    return written_count
+        writer.writerows(format_csv_row(item) for item in export_items)
+    
+    for word in duplicates:
+        print(f"  ⚠ Skipping duplicate in file: {word}")
+    for word in missing:
+        print(f"  ⚠ Skipping {word}: missing definition")
+    
+    return len(export_items)
 
 
 def sync_to_anki(limit: Optional[int] = None, dry_run: bool = False, output_file: Optional[str] = None):
@@ -137,7 +165,7 @@ def sync_to_anki(limit: Optional[int] = None, dry_run: bool = False, output_file
     
     # Fetch unpushed items
     print("Fetching unpushed items...")
-    query = supabase.table('anki_queue').select('*').is_('pushed_to_anki_at', 'null').order('created_at', desc=False)
+    query = supabase.table('anki_queue').select('id, word, definition, tags').is_('pushed_to_anki_at', 'null').order('created_at', desc=False)
     
     if limit:
         query = query.limit(limit)
@@ -154,12 +182,14 @@ def sync_to_anki(limit: Optional[int] = None, dry_run: bool = False, output_file
     if dry_run:
         print("\n[DRY RUN MODE - No changes will be made]\n")
         for item in items:
-            word = item['word']
-            definition = item.get('definition', '')
-            tags = item.get('tags', REQUIRED_TAGS)
-            print(f"  Would export: {word} - {definition[:50] if definition else 'NO DEFINITION'}...")
+            definition = item.get('definition')
+            preview = definition[:50] if definition else 'NO DEFINITION'
+            print(f"  Would export: {item['word']} - {preview}...")
         return
     
+    # Use a single push timestamp for every row marked in this run
+    pushed_at = datetime.utcnow().isoformat() + 'Z'
+    
     # Create output directory if it doesn't exist
     output_dir = Path(OUTPUT_DIR)
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -187,7 +217,9 @@ def sync_to_anki(limit: Optional[int] = None, dry_run: bool = False, output_file
         print(f"\n⚠ Skipping {len(skipped_items)} item(s) without definitions:")
         for item in skipped_items:
             print(f"  - {item['word']} (ID: {item['id']})")
-            update_queue_status(supabase, item['id'], False, "missing definition")
+        update_queue_status(
+            supabase, [item['id'] for item in skipped_items], False, "missing definition"
+        )
     
     if not valid_items:
         print("\nNo items with definitions to export.")
@@ -205,10 +237,14 @@ def sync_to_anki(limit: Optional[int] = None, dry_run: bool = False, output_file
     
     # Mark items as pushed
     print("\nMarking items as pushed in database...")
-    for item in valid_items:
-        update_queue_status(supabase, item['id'], True)
+    marked = update_queue_status(
+        supabase, [item['id'] for item in valid_items], True, pushed_at=pushed_at
+    )
     
-    print(f"\n✓ Marked {len(valid_items)} item(s) as pushed")
+    if marked:
+        print(f"\n✓ Marked {len(valid_items)} item(s) as pushed")
+    else:
+        print("\n⚠ Some items could not be marked as pushed; they will be exported again on the next sync")
     
     # Print import instructions
     print("\n" + "="*60)